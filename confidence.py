@@ -4,20 +4,97 @@
 """
 import os
 import asyncio
-import time
+import logging
 import re
+import json
+import random
+import math
+from typing import Any, Callable, Optional, Tuple
 from openai import AsyncOpenAI
 from search import SearchService
 from dotenv import load_dotenv
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # 从环境变量读取置信度阈值，默认 0.7
 CONFIDENCE_THRESHOLD = float(os.getenv("CONFIDENCE_THRESHOLD", "0.7"))
 
 # 检查是否配置了 EXA_API_KEY
 EXA_API_KEY = os.getenv("EXA_API_KEY")
 
+# 跳过置信度评估的题型（逗号分隔），这些题型直接返回初始答案，默认判断题
+SKIP_CONFIDENCE_TYPES = {t.strip() for t in os.getenv("SKIP_CONFIDENCE_TYPES", "judgement").split(",") if t.strip()}
+
+# 使用答案 token 的对数概率作为置信度的题型（逗号分隔，需 API 支持 logprobs），默认不启用
+LOGPROB_CONFIDENCE_TYPES = {t.strip() for t in os.getenv("LOGPROB_CONFIDENCE_TYPES", "").split(",") if t.strip()}
+
+# 配置了 EXA_API_KEY 时，是否在获取初始答案的同时预取搜索结果（置信度充足时取消）
+SEARCH_PREFETCH = os.getenv("SEARCH_PREFETCH", "true").lower() == "true"
+
+# 从冗长回答中提取选项字母（前后不紧邻其他英文字母，避免匹配单词中的字母）
+_OPTION_LETTER_PATTERN = re.compile(r'(?<![A-Za-z])([A-Z])(?![A-Za-z])')
+# 整个回答是连续的选项字母（如多选题回答 "ABD"）
+_OPTION_RUN_PATTERN = re.compile(r'^[A-Z]{2,}$')
+# 选项文本中的选项标签（如 "A. xxx"、"B、xxx"、"C) xxx"）
+_OPTION_LABEL_PATTERN = re.compile(r'(?:^|\s)([A-Z])\s*[.．、:：)）]')
+# 无法从选项文本中识别标签时，视为有效的选项字母
+_DEFAULT_OPTION_LETTERS = frozenset("ABCDEFGH")
+
+# 单次 LLM 调用超时（秒），超时视为可重试的失败
+LLM_ATTEMPT_TIMEOUT = float(os.getenv("LLM_ATTEMPT_TIMEOUT", "30"))
+
+# 对冲请求延迟（秒）：初始回答超过该时间仍未返回时，并发发起一个相同请求，取先完成者；0 表示关闭
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "0"))
+
+# 重试退避参数（秒）
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 8.0
+
+# 各题型的最大输出 token 数（答案越受约束，上限越低），未知题型使用默认值
+_MAX_TOKENS = {"single": 4, "judgement": 4, "multiple": 32, "completion": 200}
+_DEFAULT_MAX_TOKENS = 500
+
+# 以流式方式读取的题型：答案很短，累积超过字符上限即关闭连接，不再等待剩余生成
+_STREAM_TYPES = {"single", "judgement"}
+# 流式读取时最多累积的字符数
+_STREAM_MAX_CHARS = 8
+
+# 以 JSON 同时返回答案和置信度时额外需要的 token 数
+_JSON_OVERHEAD_TOKENS = 32
+
+# 各题型的 prompt 结尾要求
+_TYPE_SUFFIX = {
+    "single": "\n这是一道单选题，请仅返回正确答案的选项字母（如A、B、C、D），不要有其他解释，包括答案是等描述。",
+    "multiple": "\n这是一道多选题，请返回所有正确答案的选项字母，用#号分隔（如A#C#D），不要有其他解释。包括答案是等描述。",
+    "judgement": '\n这是一道判断题，请仅返回"正确"或"错误"，不要有其他解释。包括答案是等描述。',
+    "completion": "\n这是一道填空题，请直接给出填空答案，如果有多个空，用#号分隔。",
+}
+_DEFAULT_SUFFIX = "\n请直接给出答案。"
+
+# ---------- prompt 固定部分 ----------
+# 固定内容放在消息前部，题目等可变内容放在末尾，使不同请求共享尽可能长的相同前缀，便于服务端的前缀缓存
+_ANSWER_SYSTEM_PROMPT = "你是一个专业的答题助手，请根据题目给出准确答案。"
+
+# 初始回答时要求 LLM 以 JSON 同时返回答案和置信度，省去单独的置信度评估调用
+_CONFIDENCE_SYSTEM_PROMPT = (
+    "你是一个专业的答题助手，请根据题目给出准确答案，并评估答案的置信度，以 JSON 格式返回。"
+    '返回格式为 {"answer": "答案", "confidence": 置信度}。其中 answer 按题目后的要求填写；'
+    "confidence 为0到1之间的一个数字，表示该答案正确的可能性"
+    "（0表示完全不可能正确，1表示完全确定正确）。只返回 JSON，不要有其他解释描述。"
+)
+
+_SEARCH_RETRY_SYSTEM_PROMPT = "你是一个专业的答题助手，请根据题目、第一次答案的参考和联网搜索的信息给出准确答案。"
+_SEARCH_RETRY_PREAMBLE = (
+    "注意：这是第二次回答此问题。由于第一次回答的置信度较低，通过联网搜索获取了相关参考信息。"
+    "请结合搜索信息和首次回答的答案和对应的置信度，重新仔细分析题目，给出更准确的答案。\n\n"
+    "联网搜索获取到的相关参考信息：\n\n"
+)
+
+_RETRY_SYSTEM_PROMPT = "你是一个专业的答题助手，请根据题目给出准确答案。注意第一次答案的置信度较低，请重新仔细分析。"
+_RETRY_PREAMBLE = "注意：这是第二次回答此问题。由于第一次回答的置信度较低，请重新仔细分析题目，给出更准确的答案。\n\n"
+
 
 def remove_punctuation(text: str) -> str:
     """
@@ -72,14 +149,222 @@ def validate_answer(answer: str, question_type: str) -> bool:
         return len(answer) > 0
 
 
+def _option_letters(options: Optional[str]) -> frozenset:
+    """获取选项文本中出现的选项字母，识别不到至少两个标签时使用 A-H"""
+    labels = frozenset(_OPTION_LABEL_PATTERN.findall(options)) if options else frozenset()
+    return labels if len(labels) >= 2 else _DEFAULT_OPTION_LETTERS
+
+
+def coerce_answer(answer: str, question_type: str, options: Optional[str] = None) -> Optional[str]:
+    """
+    从格式不规范的回答中提取规范答案（如 "答案是 A" -> "A"、多选题 "ABD" -> "A#B#D"），避免为此重新请求LLM
+
+    Args:
+        answer: LLM 返回的答案
+        question_type: 题目类型（仅处理 single/multiple/judgement）
+        options: 选项文本（可选），提供时只接受其中出现的选项字母
+
+    Returns:
+        Optional[str]: 提取出的规范答案，无法可靠提取时返回 None
+    """
+    if not answer:
+        return None
+
+    if question_type in ("single", "multiple"):
+        text = answer.strip()
+        if question_type == "multiple" and _OPTION_RUN_PATTERN.match(text):
+            letters = list(dict.fromkeys(text))
+        else:
+            letters = list(dict.fromkeys(_OPTION_LETTER_PATTERN.findall(text)))
+
+        # 出现任何不是选项的大写字母（如 "I think A"）时无法可靠判断，交给重新请求
+        valid_letters = _option_letters(options)
+        if not all(letter in valid_letters for letter in letters):
+            return None
+
+        if question_type == "single":
+            return letters[0] if len(letters) == 1 else None
+        return "#".join(sorted(letters)) if letters else None
+    elif question_type == "judgement":
+        is_wrong = "错误" in answer or "不正确" in answer
+        is_right = "正确" in answer.replace("不正确", "")
+        if is_right != is_wrong:
+            return "正确" if is_right else "错误"
+
+    return None
+
+
+def _max_tokens_for(question_type: str) -> int:
+    """获取题型对应的最大输出 token 数"""
+    return _MAX_TOKENS.get(question_type, _DEFAULT_MAX_TOKENS)
+
+
+def _backoff_delay(attempt: int) -> float:
+    """计算带随机抖动的指数退避等待时间（秒）"""
+    return min(RETRY_BASE_DELAY * (2 ** attempt) + random.uniform(0, 0.5), RETRY_MAX_DELAY)
+
+
+async def _create_completion(client: AsyncOpenAI, hedge_delay: float = 0, **kwargs):
+    """
+    调用 chat.completions.create，带单次超时和可选的对冲请求
+
+    Args:
+        client: AsyncOpenAI客户端
+        hedge_delay: 对冲延迟（秒），大于0时若首个请求在该时间内未完成，则再发起一个相同请求，取先成功者
+        **kwargs: 传给 chat.completions.create 的参数
+
+    Returns:
+        ChatCompletion: LLM 响应
+
+    Raises:
+        asyncio.TimeoutError: 超过 LLM_ATTEMPT_TIMEOUT 仍未获得响应
+    """
+    if hedge_delay <= 0:
+        return await asyncio.wait_for(client.chat.completions.create(**kwargs), timeout=LLM_ATTEMPT_TIMEOUT)
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LLM_ATTEMPT_TIMEOUT
+    pending = {asyncio.create_task(client.chat.completions.create(**kwargs))}
+    hedged = False
+    error = None
+
+    try:
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+
+            wait_timeout = remaining if hedged else min(hedge_delay, remaining)
+            done, pending = await asyncio.wait(pending, timeout=wait_timeout, return_when=asyncio.FIRST_COMPLETED)
+
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+
+            if not pending:
+                raise error
+
+            if not done and not hedged:
+                # 首个请求迟迟未返回，发起对冲请求
+                pending.add(asyncio.create_task(client.chat.completions.create(**kwargs)))
+                hedged = True
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _stream_answer(client: AsyncOpenAI, **kwargs) -> str:
+    """
+    流式调用LLM，读取到流结束或累积达到字符上限时关闭连接
+
+    不在中途按 validate_answer 提前结束：回答的前缀也可能通过验证（如 "答案是B" 的第一个字 "答"），
+    完整内容由调用方验证，不规范时再用 coerce_answer 提取
+
+    Args:
+        client: AsyncOpenAI客户端
+        **kwargs: 传给 chat.completions.create 的参数
+
+    Returns:
+        str: 累积的回答内容
+    """
+    stream = await client.chat.completions.create(stream=True, **kwargs)
+    content = ""
+    try:
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            content += delta
+            if len(content.strip()) >= _STREAM_MAX_CHARS:
+                break
+    finally:
+        await stream.close()
+
+    return content.strip()
+
+
+def _logprob_confidence(choice: Any, answer: str) -> Optional[float]:
+    """
+    以答案所在 token 的概率作为置信度（需请求时开启 logprobs）
+
+    Args:
+        choice: LLM 响应中的 choice
+        answer: 解析出的答案
+
+    Returns:
+        Optional[float]: 置信度，无 logprobs 信息或找不到答案 token 时返回 None
+    """
+    logprobs = getattr(choice, "logprobs", None)
+    tokens = getattr(logprobs, "content", None)
+    if not tokens or not answer:
+        return None
+
+    for token in tokens:
+        if token.token.strip().strip('"') == answer:
+            return math.exp(token.logprob)
+
+    return None
+
+
+def _parse_answer_with_confidence(content: str, choice: Any = None) -> Tuple[str, Optional[float]]:
+    """
+    解析初始回答返回的 {"answer": "...", "confidence": 0.xx}
+
+    Args:
+        content: LLM 返回的原始文本
+        choice: LLM 响应中的 choice，带有 logprobs 时优先以答案 token 的概率作为置信度
+
+    Returns:
+        tuple: (答案, 置信度)，置信度无法解析时为 None
+    """
+    try:
+        data = json.loads(content)
+        answer = data.get("answer", "")
+        if isinstance(answer, list):
+            answer = "#".join(str(item) for item in answer)
+        answer = str(answer).strip()
+        confidence = float(data["confidence"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        # JSON 不规范时退化为正则提取，置信度只从 "confidence" 字段读取，不取答案中的数字（如 "1949年"）
+        answer_match = re.search(r'"answer"\s*:\s*"([^"]*)"', content)
+        if answer_match:
+            answer = answer_match.group(1).strip()
+        elif content.lstrip().startswith("{"):
+            # 看起来是 JSON 但提取不到答案（如输出被 max_tokens 截断），返回空答案使验证失败并重试
+            answer = ""
+        else:
+            answer = content
+        confidence_match = re.search(r'"confidence"\s*:\s*([0-9]*\.?[0-9]+)', content)
+        confidence = float(confidence_match.group(1)) if confidence_match else None
+
+    logprob_confidence = _logprob_confidence(choice, answer)
+    if logprob_confidence is not None:
+        confidence = logprob_confidence
+
+    if confidence is not None:
+        # 限制在 0-1 范围内
+        confidence = max(0.0, min(1.0, confidence))
+
+    return answer, confidence
+
+
 async def _call_llm_with_validation(
     client: AsyncOpenAI,
     model: str,
     messages: list,
     question_type: str,
     max_retries: int = 3,
-    context_description: str = "LLM调用"
-) -> str:
+    context_description: str = "LLM调用",
+    parser: Optional[Callable[[str, Any], tuple]] = None,
+    response_format: Optional[dict] = None,
+    hedge_delay: float = 0,
+    max_tokens: Optional[int] = None,
+    logprobs: bool = False,
+    options: Optional[str] = None
+):
     """
     调用LLM并验证答案格式，失败则重试
 
@@ -90,42 +375,90 @@ async def _call_llm_with_validation(
         question_type: 题目类型（用于验证）
         max_retries: 最大重试次数
         context_description: 上下文描述（用于日志）
+        parser: 可选的解析回调，接收原始文本和响应 choice，返回元组，第一个元素为答案
+        response_format: 可选的响应格式（如 {"type": "json_object"}）
+        hedge_delay: 对冲请求延迟（秒），0 表示不发起对冲请求
+        max_tokens: 最大输出 token 数，默认按题型确定
+        logprobs: 是否请求输出 token 的对数概率（供 parser 使用）
+        options: 选项文本（可选），用于从不规范的回答中提取选项字母
 
     Returns:
-        str: 验证通过的答案（如果所有重试都失败，返回最后一次的答案）
+        未提供 parser 时返回验证通过的答案字符串；提供 parser 时返回其解析结果元组
+        （如果所有重试都失败，返回最后一次的结果）
     """
-    start_time = time.time()
-    answer = None
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    result = None
+
+    if max_tokens is None:
+        max_tokens = _max_tokens_for(question_type)
+
+    create_kwargs = {}
+    if response_format:
+        create_kwargs["response_format"] = response_format
+    if logprobs:
+        create_kwargs["logprobs"] = True
 
     for attempt in range(max_retries):
         try:
-            response = await client.chat.completions.create(
-                model=model,
-                messages=messages,
-                temperature=0.3,
-                max_tokens=500
-            )
-            answer = response.choices[0].message.content.strip()
+            if parser is None and question_type in _STREAM_TYPES:
+                # 答案只有一两个字，流式读取，回答过长时提前中断
+                content = await asyncio.wait_for(
+                    _stream_answer(
+                        client,
+                        model=model,
+                        messages=messages,
+                        temperature=0.3,
+                        max_tokens=max_tokens,
+                        **create_kwargs
+                    ),
+                    timeout=LLM_ATTEMPT_TIMEOUT
+                )
+            else:
+                response = await _create_completion(
+                    client,
+                    hedge_delay=hedge_delay,
+                    model=model,
+                    messages=messages,
+                    temperature=0.3,
+                    max_tokens=max_tokens,
+                    **create_kwargs
+                )
+                choice = response.choices[0]
+                content = choice.message.content.strip()
+            result = parser(content, choice) if parser else content
+            answer = result[0] if parser else result
 
             # 验证答案格式
             if validate_answer(answer, question_type):
                 if attempt > 0:
-                    print(f"[{context_description}] 验证重试成功，答案: {answer}")
-                return answer
-            else:
-                print(f"[{context_description}] 答案格式不规范 (尝试 {attempt + 1}/{max_retries}: {answer}")
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(1)
+                    logger.info("[%s] 验证重试成功，答案: %s", context_description, answer)
+                return result
+
+            # 尝试从不规范的回答中直接提取答案，提取失败才重新请求
+            coerced = coerce_answer(answer, question_type, options)
+            if coerced:
+                logger.info("[%s] 从不规范答案中提取: %s -> %s", context_description, answer, coerced)
+                return (coerced, *result[1:]) if parser else coerced
+
+            logger.warning("[%s] 答案格式不规范 (尝试 %d/%d: %s", context_description, attempt + 1, max_retries, answer)
+            if attempt < max_retries - 1:
+                await asyncio.sleep(1)
+
+        except asyncio.TimeoutError:
+            logger.warning("[%s] API调用超时 (尝试 %d/%d: 超过 %.0f 秒", context_description, attempt + 1, max_retries, LLM_ATTEMPT_TIMEOUT)
+            if attempt < max_retries - 1:
+                await asyncio.sleep(_backoff_delay(attempt))
 
         except Exception as e:
-            print(f"[{context_description}] API调用失败 (尝试 {attempt + 1}/{max_retries}: {str(e)}")
+            logger.warning("[%s] API调用失败 (尝试 %d/%d: %s", context_description, attempt + 1, max_retries, e)
             if attempt < max_retries - 1:
-                await asyncio.sleep(2 ** attempt)
+                await asyncio.sleep(_backoff_delay(attempt))
 
-    # 所有重试都失败，返回最后一次的答案（可能无效）
-    total_elapsed = (time.time() - start_time) * 1000
-    print(f"[{context_description}] 警告: 所有重试均未能获得有效答案，返回最后一次结果: {answer} (总耗时: {total_elapsed:.0f}ms)")
-    return answer
+    # 所有重试都失败，返回最后一次的结果（可能无效）
+    total_elapsed = (loop.time() - start_time) * 1000
+    logger.warning("[%s] 警告: 所有重试均未能获得有效答案，返回最后一次结果: %s (总耗时: %.0fms)", context_description, result, total_elapsed)
+    return result
 
 
 def _build_prompt(title: str, options: str = None, question_type: str = None) -> str:
@@ -140,23 +473,72 @@ def _build_prompt(title: str, options: str = None, question_type: str = None) ->
     Returns:
         str: 构建好的 prompt
     """
-    prompt = f"题目：{title}\n"
+    parts = ["题目：", title, "\n"]
 
     if options:
-        prompt += f"\n选项：\n{options}\n"
+        parts += ["\n选项：\n", options, "\n"]
+
+    parts.append(_TYPE_SUFFIX.get(question_type, _DEFAULT_SUFFIX))
+    return "".join(parts)
+
+
+async def _search_context(
+    title: str,
+    options: str = None,
+    question_type: str = None,
+    search_service: Optional[SearchService] = None
+) -> str:
+    """
+    联网搜索题目相关信息
+
+    Args:
+        title: 题目文本
+        options: 选项文本（可选）
+        question_type: 题目类型（可选）
+        search_service: 长期复用的搜索服务，不提供时临时创建
+
+    Returns:
+        str: 提取后的搜索上下文
+    """
+    if search_service is None:
+        async with SearchService(verbose=False) as temp_service:
+            return await _search_context(title, options, question_type, temp_service)
+
+    # 构建搜索查询，去除标点符号以提高搜索效果
+    search_query = remove_punctuation(title)
+    if options and question_type in ["single", "multiple"]:
+        # 对于选择题，将选项也加入搜索查询
+        search_query += f" {remove_punctuation(options)}"
+
+    # 调用搜索服务
+    loop = asyncio.get_running_loop()
+    search_start = loop.time()
+    search_context = await search_service.search_and_extract(
+        query=search_query,
+        num_results=3,
+        include_url=False,
+        timeout=30
+    )
+    search_elapsed = (loop.time() - search_start) * 1000
+
+    logger.info("[搜索完成] 获取到上下文信息，长度: %d 字符 (搜索耗时: %.0fms)", len(search_context), search_elapsed)
+    return search_context
+
+
+def _discard_task_result(task: asyncio.Task):
+    """读取已结束任务的异常（不使用），避免 asyncio 报告异常未被读取"""
+    if not task.cancelled():
+        task.exception()
 
-    if question_type == "single":
-        prompt += "\n这是一道单选题，请仅返回正确答案的选项字母（如A、B、C、D），不要有其他解释，包括答案是等描述。"
-    elif question_type == "multiple":
-        prompt += "\n这是一道多选题，请返回所有正确答案的选项字母，用#号分隔（如A#C#D），不要有其他解释。包括答案是等描述。"
-    elif question_type == "judgement":
-        prompt += '\n这是一道判断题，请仅返回"正确"或"错误"，不要有其他解释。包括答案是等描述。'
-    elif question_type == "completion":
-        prompt += "\n这是一道填空题，请直接给出填空答案，如果有多个空，用#号分隔。"
-    else:
-        prompt += "\n请直接给出答案。"
 
-    return prompt
+def _cancel_task(task: asyncio.Task):
+    """
+    取消结果已不再需要的任务，不等待其结束
+
+    不等待可避免吞掉针对当前协程的取消；搜索任务被取消后，search() 会在没有其他调用方等待时取消底层请求
+    """
+    task.cancel()
+    task.add_done_callback(_discard_task_result)
 
 
 async def answer_with_confidence(
@@ -165,17 +547,18 @@ async def answer_with_confidence(
     title: str,
     options: str = None,
     question_type: str = None,
-    confidence_threshold: float = None
+    confidence_threshold: float = None,
+    search_service: Optional[SearchService] = None
 ):
     """
     带置信度判断的LLM回答函数，用于替代 _call_llm(self, prompt)
 
     流程：
     1. 根据题目和选项构建prompt
-    2. 调用LLM获取初始答案
-    3. 让LLM评估该答案的置信度（0-1之间的数字）
-    4. 如果置信度高于阈值，直接返回答案
-    5. 如果置信度低于阈值，调用联网搜索获取参考信息
+    2. 调用LLM获取初始答案，并在同一次调用中让其评估置信度（0-1之间的数字）
+    3. 置信度无法解析时使用默认值 0.5
+    4. 如果置信度高于阈值，直接返回答案（SKIP_CONFIDENCE_TYPES 中的题型不评估置信度，直接返回初始答案）
+    5. 如果置信度低于阈值，调用联网搜索获取参考信息（默认在步骤2时已并发预取，置信度充足时取消）
     6. 将搜索结果加入上下文，重新让LLM回答
 
     Args:
@@ -185,11 +568,13 @@ async def answer_with_confidence(
         options: 选项文本（可选）
         question_type: 题目类型（可选）
         confidence_threshold: 置信度阈值，默认使用环境变量配置
+        search_service: 长期复用的搜索服务（保持连接池常驻），不提供时每次搜索临时创建
 
     Returns:
         str: LLM生成的答案
     """
-    overall_start_time = time.time()
+    loop = asyncio.get_running_loop()
+    overall_start_time = loop.time()
 
     if confidence_threshold is None:
         confidence_threshold = CONFIDENCE_THRESHOLD
@@ -197,186 +582,144 @@ async def answer_with_confidence(
     # ============== 步骤1: 构建prompt ==============
     prompt = _build_prompt(title, options, question_type)
 
-    # ============== 步骤2: 获取LLM初始答案（带验证） ==============
-    step2_start = time.time()
-    answer = await _call_llm_with_validation(
-        client=client,
-        model=model,
-        messages=[
-            {"role": "system", "content": "你是一个专业的答题助手，请根据题目给出准确答案。"},
-            {"role": "user", "content": prompt}
-        ],
-        question_type=question_type,
-        context_description="初始答案获取"
-    )
-    step2_elapsed = (time.time() - step2_start) * 1000
-    print(f"[初始回答] 答案: {answer} (总耗时: {step2_elapsed:.0f}ms)")
-
-    # ============== 步骤3: 评估答案置信度（带重试） ==============
-    step3_start = time.time()
-    confidence_prompt = f"""题目：{title}
-
-选项：
-{options if options else "无选项（判断题或填空题）"}
-
-我给出的答案是：{answer}
-
-请评估这个答案正确的可能性有多大，给出0到1之间的一个数字（0表示完全不可能正确，1表示完全确定正确）。只返回数字，不要有其他解释描述。"""
-
-    confidence = None
-    max_confidence_retries = 3
-
-    for attempt in range(max_confidence_retries):
-        attempt_start = time.time()
-        try:
-            confidence_response = await client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "你是一个专业的答案评估助手，只返回0到1之间的数字。"},
-                    {"role": "user", "content": confidence_prompt}
-                ],
-                temperature=0.3,
-                max_tokens=10
-            )
-            attempt_elapsed = (time.time() - attempt_start) * 1000
-
-            confidence_text = confidence_response.choices[0].message.content.strip()
-
-            # 尝试解析置信度数字
-            try:
-                confidence = float(confidence_text)
-                # 限制在 0-1 范围内
-                confidence = max(0.0, min(1.0, confidence))
-                # 解析成功，跳出循环
-                if attempt > 0:
-                    print(f"[置信度评估] 重试成功，置信度: {confidence:.2f} (本次耗时: {attempt_elapsed:.0f}ms)")
-                break
-            except ValueError:
-                print(f"[置信度解析失败] 尝试 {attempt + 1}/{max_confidence_retries}, 返回值: '{confidence_text}' (耗时: {attempt_elapsed:.0f}ms)")
-                if attempt < max_confidence_retries - 1:
-                    await asyncio.sleep(1)
-                    continue
-
-        except Exception as e:
-            attempt_elapsed = (time.time() - attempt_start) * 1000
-            print(f"[置信度评估失败] 尝试 {attempt + 1}/{max_confidence_retries}: {str(e)} (耗时: {attempt_elapsed:.0f}ms)")
-            if attempt < max_confidence_retries - 1:
-                await asyncio.sleep(1)
-                continue
+    # 部分题型（默认判断题）不做置信度评估，直接返回初始答案
+    if question_type in SKIP_CONFIDENCE_TYPES:
+        answer = await _call_llm_with_validation(
+            client=client,
+            model=model,
+            messages=[
+                {"role": "system", "content": _ANSWER_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            question_type=question_type,
+            context_description="初始答案获取",
+            options=options
+        )
+        overall_elapsed = (loop.time() - overall_start_time) * 1000
+        logger.info("[跳过置信度评估] 题型: %s, 直接返回答案: %s (总流程耗时: %.0fms)", question_type, answer, overall_elapsed)
+        return answer
 
-    step3_elapsed = (time.time() - step3_start) * 1000
+    # 配置了 EXA_API_KEY 时，与初始回答并发预取搜索结果，置信度不足时可直接使用
+    search_task = None
+    if EXA_API_KEY and SEARCH_PREFETCH:
+        search_task = asyncio.create_task(_search_context(title, options, question_type, search_service))
 
-    # 如果所有重试都失败，使用默认值
+    # ============== 步骤2: 获取LLM初始答案及置信度（带验证） ==============
+    step2_start = loop.time()
+    try:
+        result = await _call_llm_with_validation(
+            client=client,
+            model=model,
+            messages=[
+                {"role": "system", "content": _CONFIDENCE_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            question_type=question_type,
+            context_description="初始答案获取",
+            options=options,
+            parser=_parse_answer_with_confidence,
+            response_format={"type": "json_object"},
+            hedge_delay=LLM_HEDGE_DELAY,
+            max_tokens=_max_tokens_for(question_type) + _JSON_OVERHEAD_TOKENS,
+            logprobs=question_type in LOGPROB_CONFIDENCE_TYPES
+        )
+    except BaseException:
+        if search_task:
+            _cancel_task(search_task)
+        raise
+    answer, confidence = result if result else (None, None)
+    step2_elapsed = (loop.time() - step2_start) * 1000
+
+    # ============== 步骤3: 检查置信度 ==============
+    # 如果未能解析出置信度，使用默认值
     if confidence is None:
-        print(f"[置信度评估] 所有重试均失败，使用默认值 0.5 (总耗时: {step3_elapsed:.0f}ms)")
+        logger.info("[置信度评估] 未能解析置信度，使用默认值 0.5")
         confidence = 0.5
 
-    print(f"[置信度评估] 答案: {answer}, 置信度: {confidence:.2f}, 阈值: {confidence_threshold:.2f} (总耗时: {step3_elapsed:.0f}ms)")
+    logger.info("[初始回答] 答案: %s, 置信度: %.2f, 阈值: %.2f (总耗时: %.0fms)", answer, confidence, confidence_threshold, step2_elapsed)
 
     # ============== 步骤4: 根据置信度决定是否联网搜索 ==============
     if confidence >= confidence_threshold:
-        overall_elapsed = (time.time() - overall_start_time) * 1000
-        print(f"[置信度充足] 置信度 {confidence:.2f} >= {confidence_threshold:.2f}, 直接返回答案 (总流程耗时: {overall_elapsed:.0f}ms)")
+        if search_task:
+            _cancel_task(search_task)
+        overall_elapsed = (loop.time() - overall_start_time) * 1000
+        logger.info("[置信度充足] 置信度 %.2f >= %.2f, 直接返回答案 (总流程耗时: %.0fms)", confidence, confidence_threshold, overall_elapsed)
         return answer
 
     # ============== 步骤5: 置信度不足，根据 EXA_API_KEY 配置决定策略 ==============
-    print(f"[置信度不足] 置信度 {confidence:.2f} < {confidence_threshold:.2f}")
+    logger.info("[置信度不足] 置信度 %.2f < %.2f", confidence, confidence_threshold)
 
     if EXA_API_KEY:
         # 有 EXA_API_KEY，进行联网搜索
-        print(f"[联网搜索模式] 检测到 EXA_API_KEY，开始联网搜索...")
+        logger.info("[联网搜索模式] 检测到 EXA_API_KEY，%s...", '等待预取的搜索结果' if search_task else '开始联网搜索')
 
         try:
-            # 构建搜索查询，去除标点符号以提高搜索效果
-            search_query = remove_punctuation(title)
-            if options and question_type in ["single", "multiple"]:
-                # 对于选择题，将选项也加入搜索查询
-                search_query += f" {remove_punctuation(options)}"
-
-            # 调用搜索服务
-            search_start = time.time()
-            async with SearchService(verbose=False) as search_service:
-                search_context = await search_service.search_and_extract(
-                    query=search_query,
-                    num_results=3,
-                    include_url=False,
-                    timeout=30
-                )
-            search_elapsed = (time.time() - search_start) * 1000
-
-            print(f"[搜索完成] 获取到上下文信息，长度: {len(search_context)} 字符 (搜索耗时: {search_elapsed:.0f}ms)")
+            # 优先使用预取的搜索结果（已在获取初始答案时并发发起）
+            if search_task:
+                search_context = await search_task
+            else:
+                search_context = await _search_context(title, options, question_type, search_service)
 
             # ============== 步骤6a: 基于搜索结果和第一次答案信息重新回答（带验证） ==============
-            # 复用 _build_prompt 函数构建基础 prompt
-            base_prompt = _build_prompt(title, options, question_type)
-
-            # 同时附上第一次答案、置信度信息和搜索上下文
-            enhanced_prompt = f"""注意：这是第二次回答此问题。
-
-第一次回答的答案是：{answer}，置信度评估：{confidence:.2f}（置信度较低于阈值 {confidence_threshold:.2f}）
-
-由于置信度较低，通过联网搜索获取到以下相关参考信息：
-
-{search_context}
-
----
-
-{base_prompt}
-
-请结合搜索信息和首次回答的答案和对应的置信度，重新仔细分析题目，给出更准确的答案。"""
-
-            step6a_start = time.time()
+            # 固定说明在前，搜索上下文、第一次答案和置信度信息、题目依次附在后面
+            enhanced_prompt = "".join([
+                _SEARCH_RETRY_PREAMBLE,
+                search_context,
+                "\n\n---\n\n",
+                f"第一次回答的答案是：{answer}，置信度评估：{confidence:.2f}（置信度较低，低于阈值 {confidence_threshold:.2f}）\n\n",
+                prompt
+            ])
+
+            step6a_start = loop.time()
             final_answer = await _call_llm_with_validation(
                 client=client,
                 model=model,
                 messages=[
-                    {"role": "system", "content": "你是一个专业的答题助手，请根据题目、第一次答案的参考和联网搜索的信息给出准确答案。"},
+                    {"role": "system", "content": _SEARCH_RETRY_SYSTEM_PROMPT},
                     {"role": "user", "content": enhanced_prompt}
                 ],
                 question_type=question_type,
-                context_description="基于搜索和首次答案回答"
+                context_description="基于搜索和首次答案回答",
+                options=options
             )
-            step6a_elapsed = (time.time() - step6a_start) * 1000
+            step6a_elapsed = (loop.time() - step6a_start) * 1000
 
-            overall_elapsed = (time.time() - overall_start_time) * 1000
-            print(f"[基于搜索回答] 最终答案: {final_answer} (重答耗时: {step6a_elapsed:.0f}ms, 总流程耗时: {overall_elapsed:.0f}ms)")
+            overall_elapsed = (loop.time() - overall_start_time) * 1000
+            logger.info("[基于搜索回答] 最终答案: %s (重答耗时: %.0fms, 总流程耗时: %.0fms)", final_answer, step6a_elapsed, overall_elapsed)
             return final_answer
 
         except Exception as e:
-            overall_elapsed = (time.time() - overall_start_time) * 1000
-            print(f"[搜索失败] {str(e)}, 返回原始答案 (总流程耗时: {overall_elapsed:.0f}ms)")
+            overall_elapsed = (loop.time() - overall_start_time) * 1000
+            logger.warning("[搜索失败] %s, 返回原始答案 (总流程耗时: %.0fms)", e, overall_elapsed)
             return answer
 
     else:
         # 没有 EXA_API_KEY，使用重新回答策略
-        print(f"[重新回答模式] 未配置 EXA_API_KEY，将附上第一次答案重新回答...")
+        logger.info("[重新回答模式] 未配置 EXA_API_KEY，将附上第一次答案重新回答...")
 
         # ============== 步骤6b: 附上第一次答案和置信度信息，重新回答 ==============
-        base_prompt = _build_prompt(title, options, question_type)
-
-        retry_prompt = f"""注意：这是第二次回答此问题。
-
-第一次回答的答案是：{answer}，置信度评估：{confidence:.2f}（置信度较低，低于阈值 {confidence_threshold:.2f}）
-
-由于置信度较低，请重新仔细分析题目，给出更准确的答案。
-
-{base_prompt}"""
+        retry_prompt = "".join([
+            _RETRY_PREAMBLE,
+            f"第一次回答的答案是：{answer}，置信度评估：{confidence:.2f}（置信度较低，低于阈值 {confidence_threshold:.2f}）\n\n",
+            prompt
+        ])
 
-        step6b_start = time.time()
+        step6b_start = loop.time()
         final_answer = await _call_llm_with_validation(
             client=client,
             model=model,
             messages=[
-                {"role": "system", "content": "你是一个专业的答题助手，请根据题目给出准确答案。注意第一次答案的置信度较低，请重新仔细分析。"},
+                {"role": "system", "content": _RETRY_SYSTEM_PROMPT},
                 {"role": "user", "content": retry_prompt}
             ],
             question_type=question_type,
-            context_description="置信度低重新回答"
+            context_description="置信度低重新回答",
+            options=options
         )
-        step6b_elapsed = (time.time() - step6b_start) * 1000
+        step6b_elapsed = (loop.time() - step6b_start) * 1000
 
-        overall_elapsed = (time.time() - overall_start_time) * 1000
-        print(f"[重新回答完成] 最终答案: {final_answer} (重答耗时: {step6b_elapsed:.0f}ms, 总流程耗时: {overall_elapsed:.0f}ms)")
+        overall_elapsed = (loop.time() - overall_start_time) * 1000
+        logger.info("[重新回答完成] 最终答案: %s (重答耗时: %.0fms, 总流程耗时: %.0fms)", final_answer, step6b_elapsed, overall_elapsed)
         return final_answer
 
 
@@ -440,4 +783,5 @@ async def test_confidence():
 
 if __name__ == "__main__":
     import asyncio
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
     asyncio.run(test_confidence())
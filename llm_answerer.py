@@ -1,9 +1,12 @@
 import os
 import sys
 import hashlib
+import logging
+import logging.handlers
+import queue
 import json
 import argparse
-import time
+from collections import OrderedDict
 from datetime import datetime
 from contextlib import asynccontextmanager
 from openai import AsyncOpenAI
@@ -12,26 +15,36 @@ from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 import aiosqlite
 import asyncio
+import orjson
 import random
 from confidence import answer_with_confidence, validate_answer
+from search import get_default_service, close_default_service
 
-# 设置UTF-8编码以正确显示中文
-os.environ['PYTHONIOENCODING'] = 'utf-8'
-if sys.platform == 'win32':
-    os.system('chcp 65001 >nul 2>&1')
-    try:
-        sys.stdout.reconfigure(encoding='utf-8')
-        sys.stderr.reconfigure(encoding='utf-8')
-    except AttributeError:
-        import codecs
-        sys.stdout = codecs.getwriter('utf-8')(sys.stdout.buffer, 'strict')
-        sys.stderr = codecs.getwriter('utf-8')(sys.stderr.buffer, 'strict')
+_IS_WIN = sys.platform == 'win32'
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
 ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 CACHE_RETRY_PROBABILITY = float(os.getenv("CACHE_RETRY_PROBABILITY", "0.1"))
 
+# 后台缓存写入任务每次提交的最大记录数
+CACHE_WRITE_BATCH_SIZE = 64
+
+# 进程内热点缓存（LRU）的最大条目数，位于 SQLite 缓存之前
+HOT_CACHE_SIZE = 1024
+
+# 缓存读写 SQL：保持字符串完全一致，sqlite3 会复用其预编译语句缓存
+_SELECT_ANSWER_SQL = 'SELECT answer FROM answer_cache WHERE question_hash = ?'
+_INSERT_ANSWER_SQL = (
+    'INSERT OR REPLACE INTO answer_cache '
+    '(question_hash, title, options, question_type, answer) VALUES (?, ?, ?, ?, ?)'
+)
+
+# 缓存键算法版本，记录在数据库 PRAGMA user_version 中；算法变更时递增以触发旧缓存键迁移
+CACHE_KEY_VERSION = 2
+
 class LLMAnswerer:
     def __init__(self, api_key=None, model="gpt-3.5-turbo", db_path="answer_cache.db",
                  base_url=None, custom_headers=None):
@@ -48,6 +61,11 @@ class LLMAnswerer:
         self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
         self.custom_headers = custom_headers or {}
         self.db_conn = None
+        self._write_queue = None
+        self._writer_task = None
+        self._hot = OrderedDict()
+        self._inflight = {}
+        self.search_service = None
 
         client_kwargs = {"api_key": self.api_key}
         if self.base_url:
@@ -65,12 +83,54 @@ class LLMAnswerer:
         await self.db_conn.execute('PRAGMA synchronous=NORMAL')
         await self.db_conn.commit()
 
+        self._write_queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._cache_writer_loop())
+
     async def close_db(self):
-        """关闭数据库连接"""
+        """关闭数据库连接（先写完队列中待保存的缓存）"""
+        if self._writer_task:
+            await self._write_queue.join()
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+            self._writer_task = None
+
         if self.db_conn:
             await self.db_conn.close()
             self.db_conn = None
 
+    async def connect_search(self):
+        """获取进程内共享的搜索服务（仅在配置了 EXA_API_KEY 时），使连接池在请求间保持常驻"""
+        if os.getenv("EXA_API_KEY"):
+            self.search_service = await get_default_service()
+
+    async def close_search(self):
+        """关闭共享的搜索服务及其连接池"""
+        if self.search_service:
+            self.search_service = None
+            await close_default_service()
+
+    async def _cache_writer_loop(self):
+        """后台缓存写入任务：从队列中批量取出待保存的答案，一次事务提交"""
+        while True:
+            batch = [await self._write_queue.get()]
+            while len(batch) < CACHE_WRITE_BATCH_SIZE:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+
+            try:
+                await self.db_conn.executemany(_INSERT_ANSWER_SQL, batch)
+                await self.db_conn.commit()
+            except Exception as e:
+                logger.warning("保存缓存失败: %s", e)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+
     async def init_database(self):
         """初始化SQLite数据库"""
         await self.db_conn.execute('''
@@ -86,29 +146,61 @@ class LLMAnswerer:
         ''')
         await self.db_conn.execute('CREATE INDEX IF NOT EXISTS idx_question_hash ON answer_cache(question_hash)')
         await self.db_conn.commit()
+        await self._migrate_cache_keys()
+
+    async def _migrate_cache_keys(self):
+        """缓存键算法变更后，用当前算法重新计算已有记录的缓存键"""
+        cursor = await self.db_conn.execute('PRAGMA user_version')
+        version = (await cursor.fetchone())[0]
+        if version >= CACHE_KEY_VERSION:
+            return
+
+        cursor = await self.db_conn.execute('SELECT id, title, options FROM answer_cache')
+        rows = await cursor.fetchall()
+        await self.db_conn.executemany(
+            'UPDATE OR REPLACE answer_cache SET question_hash = ? WHERE id = ?',
+            [(self._get_cache_key(title, options), row_id) for row_id, title, options in rows]
+        )
+        await self.db_conn.execute(f'PRAGMA user_version = {CACHE_KEY_VERSION}')
+        await self.db_conn.commit()
+        logger.info("[缓存迁移] 已更新 %d 条缓存记录的缓存键", len(rows))
 
     def _get_cache_key(self, title, options):
-        """生成缓存键"""
-        content = f"{title}|{options or ''}"
-        return hashlib.md5(content.encode()).hexdigest()
+        """生成缓存键（BLAKE2b，128位摘要），各字段加长度前缀，避免分隔符导致的碰撞"""
+        h = hashlib.blake2b(digest_size=16)
+        for part in (title, options or ''):
+            data = part.encode()
+            h.update(len(data).to_bytes(4, 'little'))
+            h.update(data)
+        return h.hexdigest()
+
+    def _remember_hot(self, cache_key, answer):
+        """写入进程内热点缓存，超出容量时淘汰最久未使用的条目"""
+        self._hot[cache_key] = answer
+        self._hot.move_to_end(cache_key)
+        if len(self._hot) > HOT_CACHE_SIZE:
+            self._hot.popitem(last=False)
 
     async def _get_cached_answer(self, cache_key):
-        """从数据库获取缓存答案"""
-        cursor = await self.db_conn.execute('SELECT answer FROM answer_cache WHERE question_hash = ?', (cache_key,))
-        result = await cursor.fetchone()
-        return result[0] if result else None
+        """获取缓存答案（先查进程内热点缓存，未命中再查数据库）"""
+        answer = self._hot.get(cache_key)
+        if answer is not None:
+            self._hot.move_to_end(cache_key)
+            return answer
+
+        # execute_fetchall 在数据库线程内一次完成查询和取数，不共享游标，并发请求间互不干扰
+        rows = await self.db_conn.execute_fetchall(_SELECT_ANSWER_SQL, (cache_key,))
+        if not rows:
+            return None
+
+        answer = rows[0][0]
+        self._remember_hot(cache_key, answer)
+        return answer
 
     async def _save_to_cache(self, cache_key, title, options, question_type, answer):
-        """保存答案到数据库"""
-        try:
-            await self.db_conn.execute('''
-                INSERT OR REPLACE INTO answer_cache
-                (question_hash, title, options, question_type, answer)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (cache_key, title, options, question_type, answer))
-            await self.db_conn.commit()
-        except Exception as e:
-            print(f"保存缓存失败: {e}")
+        """保存答案到缓存（更新热点缓存，数据库写入放入队列由后台任务批量提交）"""
+        self._remember_hot(cache_key, answer)
+        await self._write_queue.put((cache_key, title, options, question_type, answer))
 
     async def _call_llm(self, title, options=None, question_type=None):
         """调用OpenAI API（带置信度判断版本）"""
@@ -117,7 +209,8 @@ class LLMAnswerer:
             model=self.model,
             title=title,
             options=options,
-            question_type=question_type
+            question_type=question_type,
+            search_service=self.search_service
         )
         return answer
 
@@ -126,39 +219,60 @@ class LLMAnswerer:
         将题目转换为LLM请求并获取答案
         返回格式: [error_msg, answer, elapsed_time]
         """
-        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
         cache_key = self._get_cache_key(title, options)
 
         if not skip_cache:
             cached_answer = await self._get_cached_answer(cache_key)
             if cached_answer:
-                elapsed = time.time() - start_time
+                elapsed = loop.time() - start_time
                 if random.random() < CACHE_RETRY_PROBABILITY:
-                    print(f"[缓存命中-随机重试] 题目: {title[:50]}... -> 旧答案: {cached_answer} (耗时: {elapsed*1000:.0f}ms)")
+                    logger.info("[缓存命中-随机重试] 题目: %s... -> 旧答案: %s (耗时: %.0fms)", title[:50], cached_answer, elapsed*1000)
                 else:
-                    print(f"[缓存命中] 题目: {title[:50]}... -> 答案: {cached_answer} (耗时: {elapsed*1000:.0f}ms)")
+                    logger.info("[缓存命中] 题目: %s... -> 答案: %s (耗时: %.0fms)", title[:50], cached_answer, elapsed*1000)
                     return [None, cached_answer, elapsed]
 
+        # 相同题目已有请求正在调用 LLM 时，直接等待其结果，不重复调用
+        task = self._inflight.get(cache_key)
+        if task is None:
+            task = asyncio.create_task(self._answer_with_llm(cache_key, title, options, question_type))
+            self._inflight[cache_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(cache_key, None))
+        else:
+            logger.info("[合并请求] 题目: %s... 正在由其他请求调用LLM，等待其结果", title[:50])
+
+        # shield：单个请求被取消时不影响其他请求共享的 LLM 调用
+        error_msg, answer = await asyncio.shield(task)
+        return [error_msg, answer, loop.time() - start_time]
+
+    async def _answer_with_llm(self, cache_key, title, options, question_type):
+        """
+        调用LLM获取答案并写入缓存（同一缓存键的并发请求共享一次调用）
+        返回格式: (error_msg, answer)
+        """
+        loop = asyncio.get_running_loop()
+        start_time = loop.time()
+
         # confidence.py 已经实现了重试和验证机制，这里只需要调用一次
         try:
             answer = await self._call_llm(title, options, question_type)
-            elapsed = time.time() - start_time
+            elapsed = loop.time() - start_time
 
             # confidence.py 内部已经做了验证，但这里再次验证以确保万无一失
             if validate_answer(answer, question_type):
                 await self._save_to_cache(cache_key, title, options, question_type, answer)
-                print(f"[LLM回答] 题目: {title[:50]}... -> 答案: {answer} (耗时: {elapsed*1000:.0f}ms)")
-                return [None, answer, elapsed]
+                logger.info("[LLM回答] 题目: %s... -> 答案: %s (耗时: %.0fms)", title[:50], answer, elapsed*1000)
+                return None, answer
             else:
                 # 理论上不应该到这里，因为 confidence.py 已经验证过
-                elapsed = time.time() - start_time
-                print(f"[警告] confidence.py 返回了无效答案: {answer} (耗时: {elapsed*1000:.0f}ms)")
-                return ["LLM返回的答案格式不规范", None, elapsed]
+                logger.warning("[警告] confidence.py 返回了无效答案: %s (耗时: %.0fms)", answer, elapsed*1000)
+                return "LLM返回的答案格式不规范", None
 
         except Exception as e:
-            elapsed = time.time() - start_time
-            print(f"[请求失败] {str(e)} (耗时: {elapsed*1000:.0f}ms)")
-            return [f"LLM请求失败: {str(e)}", None, elapsed]
+            elapsed = loop.time() - start_time
+            logger.error("[请求失败] %s (耗时: %.0fms)", e, elapsed*1000)
+            return f"LLM请求失败: {str(e)}", None
 
     def get_config_info(self):
         """获取配置信息"""
@@ -172,15 +286,62 @@ class LLMAnswerer:
 GLOBAL_SKIP_CACHE = False
 answerer = None
 
+def _setup_console():
+    """
+    在程序入口处一次性配置控制台输出：UTF-8 编码以正确显示中文，
+    日志经队列交由后台线程写入 stdout，请求处理中不直接阻塞在控制台写入上
+
+    Returns:
+        logging.handlers.QueueListener: 已启动的日志监听器，退出时需调用 stop()
+    """
+    os.environ['PYTHONIOENCODING'] = 'utf-8'
+    if _IS_WIN:
+        os.system('chcp 65001 >nul 2>&1')
+        sys.stdout.reconfigure(encoding='utf-8')
+        sys.stderr.reconfigure(encoding='utf-8')
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter('%(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    # QueueHandler 入队前会按自身格式化器生成消息，需同样只保留消息本身，否则 basicConfig 会套用默认的 "级别:模块名:" 前缀
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    # 根日志保持 WARNING，只对本项目的模块开启 INFO，避免第三方库（如 httpx 每次请求的日志）刷屏
+    logging.basicConfig(level=logging.WARNING, handlers=[queue_handler])
+    for name in (__name__, 'confidence', 'search'):
+        logging.getLogger(name).setLevel(logging.INFO)
+
+    listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    listener.start()
+    return listener
+
+def _fix_win_query_encoding(value):
+    """Windows 下修正被按 latin1 解码的 GET 参数"""
+    if not value:
+        return value
+    try:
+        return value.encode('latin1').decode('utf-8')
+    except (UnicodeDecodeError, UnicodeEncodeError):
+        return value
+
+class ORJSONResponse(JSONResponse):
+    """使用 orjson 序列化的 JSON 响应（中文直接以 UTF-8 输出，不转义为 \\uXXXX）"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
     await answerer.connect_db()
     await answerer.init_database()
+    await answerer.connect_search()
     yield
+    await answerer.close_search()
     await answerer.close_db()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 def print_startup_info(answerer_obj, port):
     """打印启动信息"""
@@ -190,16 +351,16 @@ def print_startup_info(answerer_obj, port):
     exa_api_key = os.getenv("EXA_API_KEY")
     confidence_threshold = float(os.getenv("CONFIDENCE_THRESHOLD", "0.7"))
 
-    print("\n" + "="*60)
-    print("LLM智能答题服务启动成功（异步版本）")
-    print("="*60)
-    print(f"启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"服务地址: http://localhost:{port}")
-    print(f"API端点: http://localhost:{port}/search")
+    logger.info("\n" + "="*60)
+    logger.info("LLM智能答题服务启动成功（异步版本）")
+    logger.info("="*60)
+    logger.info("启动时间: %s", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    logger.info("服务地址: http://localhost:%s", port)
+    logger.info("API端点: http://localhost:%s/search", port)
 
     # 功能状态摘要
-    print("-"*60)
-    print("启用功能:")
+    logger.info("-"*60)
+    logger.info("启用功能:")
     features = []
     features.append(f"  ✓ 智能缓存 (随机重试概率: {CACHE_RETRY_PROBABILITY*100:.0f}%)")
     if exa_api_key:
@@ -213,38 +374,38 @@ def print_startup_info(answerer_obj, port):
         features.append(f"  ✗ 访问令牌认证 (未启用)")
 
     for feature in features:
-        print(feature)
+        logger.info(feature)
 
     # LLM配置
-    print("-"*60)
-    print("LLM配置:")
-    print(f"  模型: {config['model']}")
-    print(f"  API地址: {config['base_url']}")
-    print(f"  API密钥: {'已设置' if config['api_key_set'] else '未设置'}")
+    logger.info("-"*60)
+    logger.info("LLM配置:")
+    logger.info("  模型: %s", config['model'])
+    logger.info("  API地址: %s", config['base_url'])
+    logger.info("  API密钥: %s", '已设置' if config['api_key_set'] else '未设置')
 
     # 存储配置
-    print("-"*60)
-    print("存储配置:")
-    print(f"  数据库: {config['db_path']}")
-    print(f"  缓存策略: MD5哈希 + 随机重试")
+    logger.info("-"*60)
+    logger.info("存储配置:")
+    logger.info("  数据库: %s", config['db_path'])
+    logger.info("  缓存策略: BLAKE2b哈希 + 随机重试")
 
     # Exa搜索配置
     if exa_api_key:
-        print("-"*60)
-        print("联网搜索配置:")
-        print(f"  Exa API: 已配置")
-        print(f"  搜索触发: 置信度 < {confidence_threshold:.1f}")
+        logger.info("-"*60)
+        logger.info("联网搜索配置:")
+        logger.info("  Exa API: 已配置")
+        logger.info("  搜索触发: 置信度 < %.1f", confidence_threshold)
 
     # AnswererWrapper配置
-    print("-"*60)
-    print("AnswererWrapper配置:")
-    print("[")
+    logger.info("-"*60)
+    logger.info("AnswererWrapper配置:")
+    logger.info("[")
 
     headers_config = {"Content-Type": "application/json"}
     if ACCESS_TOKEN:
         headers_config["X-Access-Token"] = ACCESS_TOKEN
 
-    print(json.dumps({
+    logger.info(json.dumps({
         "name": "LLM智能答题",
         "url": f"http://localhost:{port}/search",
         "method": "post",
@@ -258,8 +419,8 @@ def print_startup_info(answerer_obj, port):
         },
         "handler": "return (res) => res.code === 1 ? [undefined, res.answer] : [res.msg, undefined]"
     }, ensure_ascii=False, indent=2))
-    print("]")
-    print("="*60 + "\n")
+    logger.info("]")
+    logger.info("="*60 + "\n")
 
 @app.get('/')
 @app.head('/')
@@ -279,19 +440,11 @@ async def search(request: Request):
         skip_cache = GLOBAL_SKIP_CACHE or params.get('skip_cache', 'false').lower() == 'true'
         token = request.headers.get('X-Access-Token') or params.get('token')
 
-        if title and sys.platform == 'win32':
-            try:
-                title = title.encode('latin1').decode('utf-8')
-            except (UnicodeDecodeError, UnicodeEncodeError):
-                pass
-
-        if options and sys.platform == 'win32':
-            try:
-                options = options.encode('latin1').decode('utf-8')
-            except (UnicodeDecodeError, UnicodeEncodeError):
-                pass
+        if _IS_WIN:
+            title = _fix_win_query_encoding(title)
+            options = _fix_win_query_encoding(options)
     else:
-        data = await request.json()
+        data = orjson.loads(await request.body())
         title = data.get('title', '')
         options = data.get('options')
         question_type = data.get('type')
@@ -299,17 +452,17 @@ async def search(request: Request):
         token = request.headers.get('X-Access-Token') or request.query_params.get('token') or data.get('token')
 
     if ACCESS_TOKEN and token != ACCESS_TOKEN:
-        return JSONResponse({"code": 0, "msg": "无效的访问令牌"}, status_code=401)
+        return ORJSONResponse({"code": 0, "msg": "无效的访问令牌"}, status_code=401)
 
-    print(f"\n[收到请求] {datetime.now().strftime('%H:%M:%S')} - 题型: {question_type or '未知'}")
-    print(f"  题目: {title[:100]}{'...' if len(title) > 100 else ''}")
+    logger.info("\n[收到请求] %s - 题型: %s", datetime.now().strftime('%H:%M:%S'), question_type or '未知')
+    logger.info("  题目: %s%s", title[:100], '...' if len(title) > 100 else '')
     if options:
-        print(f"  选项: {options[:100]}{'...' if len(options) > 100 else ''}")
+        logger.info("  选项: %s%s", options[:100], '...' if len(options) > 100 else '')
     if skip_cache:
-        print(f"  跳过缓存: 是")
+        logger.info("  跳过缓存: 是")
 
     if not title:
-        return JSONResponse({"code": 0, "msg": "题目不能为空"})
+        return ORJSONResponse({"code": 0, "msg": "题目不能为空"})
 
     result = await answerer.answer_question(title, options, question_type, skip_cache)
     error_msg, answer, elapsed_time = result if len(result) == 3 else (*result, 0)
@@ -322,8 +475,8 @@ async def search(request: Request):
 #            ,"elapsed_time": round(elapsed_time, 3),
 #            "elapsed_ms": round(elapsed_time * 1000, 0)
         }
-        print(f"[响应成功] 答案: {answer}, 总耗时: {elapsed_time*1000:.0f}ms")
-        return JSONResponse(response_data)
+        logger.info("[响应成功] 答案: %s, 总耗时: %.0fms", answer, elapsed_time*1000)
+        return ORJSONResponse(response_data)
     else:
         response_data = {
             "code": 0,
@@ -331,10 +484,12 @@ async def search(request: Request):
 #            ,"elapsed_time": round(elapsed_time, 3),
 #            "elapsed_ms": round(elapsed_time * 1000, 0)
         }
-        print(f"[响应失败] 错误: {error_msg}, 总耗时: {elapsed_time*1000:.0f}ms")
-        return JSONResponse(response_data)
+        logger.info("[响应失败] 错误: %s, 总耗时: %.0fms", error_msg, elapsed_time*1000)
+        return ORJSONResponse(response_data)
 
 if __name__ == '__main__':
+    log_listener = _setup_console()
+
     parser = argparse.ArgumentParser(description='LLM智能答题服务')
     parser.add_argument('-skipcache', '--skip-cache', action='store_true',
                         help='跳过缓存，所有请求直接调用LLM API')
@@ -355,8 +510,11 @@ if __name__ == '__main__':
     print_startup_info(answerer, port)
 
     if GLOBAL_SKIP_CACHE:
-        print("⚠️  缓存已全局禁用 - 所有请求将直接调用LLM API")
-        print("="*60 + "\n")
+        logger.info("⚠️  缓存已全局禁用 - 所有请求将直接调用LLM API")
+        logger.info("="*60 + "\n")
 
     import uvicorn
-    uvicorn.run(app, host='0.0.0.0', port=port)
+    try:
+        uvicorn.run(app, host='0.0.0.0', port=port)
+    finally:
+        log_listener.stop()
@@ -1,17 +1,169 @@
 """
 联网搜索模块 - 使用 Exa AI API 进行智能搜索
 异步实现，可作为库被其他异步模块引用
+
+作为库使用时，如已安装 uvloop，建议用 uvloop.run(main()) 代替 asyncio.run(main()) 以降低协程调度开销
+（uvicorn 在安装了 uvloop 时会自动使用）
+
+默认通过 aiohttp（HTTP/1.1）发送请求；安装 httpx[http2] 后可用 SearchService(transport="http2")
+在单个连接上多路复用并发请求
 """
 import os
+import sys
+import copy
+import logging
+import importlib.util
+import time
+import random
+import functools
 import asyncio
 import aiohttp
-from typing import Dict, Any, Optional
+import yarl
+from multidict import CIMultiDict, CIMultiDictProxy
+from collections import OrderedDict
+from typing import Dict, Any, Iterator, List, Mapping, Optional, Tuple, Union
 from dotenv import load_dotenv
 
 # 仅在直接执行时加载环境变量，作为库引用时由主程序负责
 if __name__ == "__main__":
     load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 优先使用 orjson 编解码 JSON，未安装时退回标准库
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    import json
+    _json_loads = json.loads
+
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False).encode()
+
+# asyncio.timeout 需要 Python 3.11+，更早的版本使用 aiohttp 自带依赖 async_timeout 中用法相同的 timeout
+if sys.version_info >= (3, 11):
+    _timeout = asyncio.timeout
+else:
+    from async_timeout import timeout as _timeout
+
+# 可选依赖：httpx 用于 HTTP/2 传输（transport="http2"）
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# 按网络错误处理的异常类型（两种传输方式的错误统一映射为"网络请求失败"）
+_NETWORK_ERRORS = (aiohttp.ClientError,) if httpx is None else (aiohttp.ClientError, httpx.TransportError)
+
+# 搜索结果缓存的最大条目数（超出时淘汰最久未使用的条目）
+SEARCH_CACHE_MAX_SIZE = 256
+
+# 限流（429）和网关/服务端临时错误时自动重试，其余状态码直接报错
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 8.0
+
+# 搜索响应超过以下规模时，search_and_extract 在线程中提取上下文，避免长时间阻塞事件循环
+EXTRACT_OFFLOAD_MIN_RESULTS = 10
+EXTRACT_OFFLOAD_MIN_CHARS = 16 * 1024
+
+
+@functools.lru_cache(maxsize=None)
+def _env_defaults() -> Tuple[Optional[str], str, int]:
+    """
+    读取环境变量中的默认配置（API密钥、基础URL、缓存TTL），整个进程只读取一次
+
+    在首次创建 SearchService 时才读取而不是在导入时读取：主程序会先导入本模块再调用 load_dotenv()
+    """
+    return (
+        os.getenv('EXA_API_KEY'),
+        os.getenv('EXA_BASE_URL', 'https://api.exa.ai'),
+        int(os.getenv('EXA_CACHE_TTL', '300'))
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _payload_tail(num_results: int, use_autoprompt: bool, include_text: bool, include_highlights: bool) -> bytes:
+    """编码请求体中除 query 以外的部分（去掉开头的 "{"），同一参数组合只编码一次"""
+    return _json_dumps({
+        "useAutoprompt": use_autoprompt,
+        "numResults": num_results,
+        "contents": {
+            "text": include_text,
+            "highlights": include_highlights
+        }
+    })[1:]
+
+
+def _build_payload(query: str, num_results: int, use_autoprompt: bool,
+                   include_text: bool, include_highlights: bool) -> bytes:
+    """拼接请求体：只需编码 query，其余部分复用缓存的编码结果"""
+    tail = _payload_tail(num_results, use_autoprompt, include_text, include_highlights)
+    return b'{"query":' + _json_dumps(query) + b',' + tail
+
+
+def _iter_context_lines(results: List[Dict[str, Any]], include_url: bool) -> Iterator[str]:
+    """逐行生成 extract_context 的输出，由调用方一次性拼接"""
+    for i, result in enumerate(results, 1):
+        yield _RESULT_HEADER(i=i, title=result.get('title', '无标题'))
+
+        url = result.get('url')
+        if include_url and url:
+            yield f"来源: {url}"
+
+        highlights = result.get('highlights')
+        if highlights:
+            yield "相关内容:"
+            for highlight in highlights:
+                yield _HIGHLIGHT_LINE(highlight)
+        else:
+            yield "相关内容: 无高亮内容"
+
+        # 空行：结果之间的分隔，以及末尾的换行
+        yield ""
+
+
+def _create_connector() -> aiohttp.TCPConnector:
+    """创建到 Exa 的连接池：长时间保持连接，避免空闲后重新 TCP+TLS 握手（aiohttp 默认已开启 TCP_NODELAY）"""
+    return aiohttp.TCPConnector(
+        limit=32,
+        limit_per_host=8,
+        keepalive_timeout=75,
+        ttl_dns_cache=300
+    )
+
+
+# extract_context 读取的搜索结果字段
+_CONTEXT_FIELDS = ("title", "url", "highlights")
+
+# extract_context 的输出格式：无结果时的提示，以及预先绑定的格式化方法
+_EMPTY_RESULT_STRING = "未找到相关搜索结果"
+_RESULT_HEADER = "【结果 {i}】\n标题: {title}".format
+_HIGHLIGHT_LINE = "  - {}".format
+
+
+def _slim_response(search_response: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留 extract_context 用到的字段（标题、URL、高亮），丢弃完整正文等大字段"""
+    # 只复制存在的键，缺失字段仍由 extract_context 的默认值处理（如 "无标题"）
+    return {
+        "results": [
+            {key: r[key] for key in _CONTEXT_FIELDS if key in r}
+            for r in search_response.get("results") or ()
+        ]
+    }
+
+
+class _InflightFetch:
+    """正在进行的搜索请求，以及等待其结果的调用方数量"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
 
 class SearchService:
     """搜索服务类，封装 Exa AI 搜索功能（异步版本）"""
@@ -20,21 +172,53 @@ class SearchService:
                  api_key: Optional[str] = None,
                  base_url: Optional[str] = None,
                  verbose: bool = False,
-                 session: Optional[aiohttp.ClientSession] = None):
+                 session: Optional[aiohttp.ClientSession] = None,
+                 max_retries: int = 3,
+                 transport: str = "http1"):
         """
         初始化异步搜索服务
 
         Args:
             api_key: Exa API密钥，默认从环境变量读取
             base_url: API基础URL，默认从环境变量读取或使用官方地址
-            verbose: 是否输出详细日志，默认False
+            verbose: 是否输出详细日志，默认False（为True时以 INFO 级别记录，否则以 DEBUG 级别记录）
             session: 可选的 aiohttp.ClientSession，如果不提供则自动创建
+            max_retries: 遇到 429/5xx 响应时的最大尝试次数，默认3次
+            transport: 传输方式，"http1" 使用 aiohttp（默认），"http2" 使用 httpx 的 HTTP/2 多路复用
+                （需安装 httpx[http2]，此时 session 参数不生效）
+
+        Raises:
+            ValueError: 未配置 EXA_API_KEY、transport 取值无效或 HTTP/2 依赖未安装时抛出
         """
-        self.api_key = api_key or os.getenv('EXA_API_KEY')
-        self.base_url = base_url or os.getenv('EXA_BASE_URL', 'https://api.exa.ai')
+        default_api_key, default_base_url, cache_ttl = _env_defaults()
+        self.api_key = api_key or default_api_key
+        self.base_url = base_url or default_base_url
+        # 预先构造请求地址，避免每次请求重新拼接和解析 URL
+        self._search_url = yarl.URL(self.base_url) / "search"
         self.verbose = verbose
+        # 详细日志的级别：verbose 时为 INFO，否则为 DEBUG（默认不输出，需要时可通过日志配置打开）
+        self._log_level = logging.INFO if verbose else logging.DEBUG
+        self.max_retries = max(1, max_retries)
         self._external_session = session  # 外部提供的 session
         self._internal_session = None     # 内部创建的 session
+        self._httpx_client = None         # transport="http2" 时内部创建的 httpx 客户端
+
+        if transport == "http1":
+            self._post = self._post_aiohttp
+        elif transport == "http2":
+            if httpx is None or importlib.util.find_spec("h2") is None:
+                raise ValueError("transport=\"http2\" 需要安装 httpx[http2]：pip install 'httpx[http2]'")
+            self._post = self._post_httpx
+        else:
+            raise ValueError(f"不支持的 transport: {transport}（可选 \"http1\" 或 \"http2\"）")
+
+        # 搜索结果缓存：key -> (写入时间, 响应数据)，TTL 为 0 时不缓存
+        self._cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        # 正在进行的请求：key -> _InflightFetch，供并发的相同请求共享
+        self._inflight: Dict[tuple, _InflightFetch] = {}
+        # 所有尚未结束的请求任务（包括已不可共享、正在取消的），close() 时统一取消并等待
+        self._fetch_tasks = set()
 
         if not self.api_key:
             raise ValueError("EXA_API_KEY 未配置。请通过参数传入或设置环境变量。")
@@ -44,6 +228,8 @@ class SearchService:
             'x-api-key': self.api_key,
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         }
+        # 预先转换为 aiohttp 内部使用的不区分大小写的只读字典，避免每次请求重新转换
+        self._headers = CIMultiDictProxy(CIMultiDict(self.headers))
 
     async def _get_session(self) -> aiohttp.ClientSession:
         """获取或创建 aiohttp session"""
@@ -51,15 +237,96 @@ class SearchService:
             return self._external_session
 
         if self._internal_session is None or self._internal_session.closed:
-            self._internal_session = aiohttp.ClientSession()
+            # 请求头在创建 session 时设置一次，无需每次请求传入
+            self._internal_session = aiohttp.ClientSession(connector=_create_connector(), headers=self._headers)
 
         return self._internal_session
 
+    def _get_httpx_client(self) -> "httpx.AsyncClient":
+        """获取或创建 HTTP/2 客户端，超时由 _fetch 中的 _timeout 统一控制"""
+        if self._httpx_client is None or self._httpx_client.is_closed:
+            self._httpx_client = httpx.AsyncClient(
+                http2=True,
+                headers=self.headers,
+                timeout=None,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=8, keepalive_expiry=75)
+            )
+        return self._httpx_client
+
+    async def _post_aiohttp(self, payload: bytes) -> Tuple[int, Mapping[str, str], bytes]:
+        """通过 aiohttp 发送搜索请求，返回 (状态码, 响应头, 响应体字节)"""
+        session = await self._get_session()
+        # 外部提供的 session 没有预设请求头，需要每次请求传入
+        headers = None if session is self._internal_session else self._headers
+
+        # 请求头中已设置 Content-Type: application/json，直接发送编码好的字节
+        async with session.post(self._search_url, headers=headers, data=payload) as response:
+            # 直接读取响应字节，交给 JSON 解析时不经过中间的 str 对象
+            return response.status, response.headers, await response.read()
+
+    async def _post_httpx(self, payload: bytes) -> Tuple[int, Mapping[str, str], bytes]:
+        """通过 httpx 的 HTTP/2 连接发送搜索请求，返回 (状态码, 响应头, 响应体字节)"""
+        response = await self._get_httpx_client().post(str(self._search_url), content=payload)
+        return response.status_code, response.headers, response.content
+
+    def _get_cached(self, key: tuple) -> Optional[Dict[str, Any]]:
+        """读取未过期的缓存结果（返回副本），过期条目在访问时删除"""
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+
+        cached_at, result = entry
+        if time.monotonic() - cached_at >= self._cache_ttl:
+            del self._cache[key]
+            return None
+
+        self._cache.move_to_end(key)
+        return copy.deepcopy(result)
+
+    def _set_cached(self, key: tuple, result: Dict[str, Any]):
+        """写入缓存（保存副本），超出容量时淘汰最久未使用的条目"""
+        if self._cache_ttl <= 0:
+            return
+
+        self._cache[key] = (time.monotonic(), copy.deepcopy(result))
+        self._cache.move_to_end(key)
+        if len(self._cache) > SEARCH_CACHE_MAX_SIZE:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _retry_delay(attempt: int, retry_after: Optional[str]) -> float:
+        """计算重试等待时间：优先使用 Retry-After 响应头（秒数），否则使用带抖动的指数退避"""
+        if retry_after:
+            try:
+                return min(max(float(retry_after), 0.0), RETRY_MAX_DELAY)
+            except ValueError:
+                pass  # HTTP 日期格式等无法解析的值，退回指数退避
+        return min(RETRY_BASE_DELAY * (2 ** attempt), RETRY_MAX_DELAY) + random.uniform(0, 0.25)
+
+    def _on_fetch_done(self, cache_key: tuple, entry: _InflightFetch, task: asyncio.Task):
+        """请求任务结束时移除登记，并读取其异常（调用方都已离开时避免 asyncio 报告异常未被读取）"""
+        if self._inflight.get(cache_key) is entry:
+            del self._inflight[cache_key]
+        self._fetch_tasks.discard(task)
+        if not task.cancelled():
+            task.exception()
+
     async def close(self):
-        """关闭内部创建的 session（如果存在）"""
+        """取消尚未完成的搜索请求，并关闭内部创建的 session 和 HTTP/2 客户端（如果存在）"""
+        # 先结束请求任务再关闭连接，避免请求在 session 关闭后以"网络请求失败"结束
+        tasks = list(self._fetch_tasks)
+        self._inflight.clear()
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
         if self._internal_session and not self._internal_session.closed:
             await self._internal_session.close()
             self._internal_session = None
+        if self._httpx_client is not None:
+            await self._httpx_client.aclose()
+            self._httpx_client = None
 
     async def search(self,
                      query: str,
@@ -67,9 +334,10 @@ class SearchService:
                      use_autoprompt: bool = True,
                      include_text: bool = False,
                      include_highlights: bool = True,
-                     timeout: int = 30) -> Dict[str, Any]:
+                     timeout: int = 30,
+                     extract_only: bool = False) -> Dict[str, Any]:
         """
-        执行异步搜索请求
+        执行异步搜索请求（相同参数的请求在 EXA_CACHE_TTL 秒内直接返回缓存结果，并发的相同请求只发起一次）
 
         Args:
             query: 搜索查询字符串
@@ -77,55 +345,124 @@ class SearchService:
             use_autoprompt: 是否使用自动提示优化，默认True
             include_text: 是否包含完整文本，默认False
             include_highlights: 是否包含高亮片段，默认True
-            timeout: 请求超时时间（秒），默认30秒
+            timeout: 整个搜索的超时时间（秒，包括 429/5xx 的重试及其等待），默认30秒
+            extract_only: 是否只保留 extract_context 需要的字段（title/url/highlights），默认False
 
         Returns:
-            搜索响应的完整JSON数据
+            搜索响应的完整JSON数据（extract_only=True 时为精简后的数据）
 
         Raises:
             Exception: 搜索请求失败时抛出
         """
-        url = f"{self.base_url}/search"
-
-        payload = {
-            "query": query,
-            "useAutoprompt": use_autoprompt,
-            "numResults": num_results,
-            "contents": {
-                "text": include_text,
-                "highlights": include_highlights
-            }
-        }
-
-        if self.verbose:
-            print(f"[SearchService] 正在搜索: {query}")
+        cache_key = (query, num_results, use_autoprompt, include_text, include_highlights, extract_only)
+        cached = self._get_cached(cache_key)
+        if cached is not None:
+            logger.log(self._log_level, "[SearchService] 命中缓存: %s", query)
+            return cached
+
+        # 相同参数的请求正在进行时共享其结果，不重复发起 HTTP 请求
+        entry = self._inflight.get(cache_key)
+        is_first = entry is None
+        if is_first:
+            task = asyncio.ensure_future(self._fetch(
+                cache_key, query, num_results, use_autoprompt, include_text, include_highlights, timeout, extract_only
+            ))
+            entry = self._inflight[cache_key] = _InflightFetch(task)
+            self._fetch_tasks.add(task)
+            task.add_done_callback(functools.partial(self._on_fetch_done, cache_key, entry))
+        else:
+            logger.log(self._log_level, "[SearchService] 合并重复请求: %s", query)
+
+        entry.waiters += 1
+        try:
+            # shield：单个调用方被取消时不影响其他调用方共享的请求
+            result = await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            if entry.waiters == 0 and not entry.task.done():
+                # 所有调用方都已取消，结果不再需要：取消请求，并不再让新的调用方共享这个正在取消的请求
+                if self._inflight.get(cache_key) is entry:
+                    del self._inflight[cache_key]
+                entry.task.cancel()
+
+        return result if is_first else copy.deepcopy(result)
+
+    async def _fetch(self,
+                     cache_key: tuple,
+                     query: str,
+                     num_results: int,
+                     use_autoprompt: bool,
+                     include_text: bool,
+                     include_highlights: bool,
+                     timeout: int,
+                     extract_only: bool) -> Dict[str, Any]:
+        """发起搜索 HTTP 请求并写入缓存，参数含义同 search()"""
+        payload = _build_payload(query, num_results, use_autoprompt, include_text, include_highlights)
 
-        session = await self._get_session()
-        timeout_config = aiohttp.ClientTimeout(total=timeout)
+        logger.log(self._log_level, "[SearchService] 正在搜索: %s", query)
 
         try:
-            async with session.post(url, headers=self.headers, json=payload, timeout=timeout_config) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"HTTP {response.status}: {error_text}")
-
-                return await response.json()
+            # timeout 是整个搜索（包括重试和重试等待）的截止时间，超时时直接取消请求
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            async with _timeout(timeout):
+                for attempt in range(self.max_retries):
+                    status, headers, body = await self._post(payload)
+
+                    if status == 200:
+                        result = _json_loads(body)
+                        if extract_only:
+                            # 在写入缓存前丢弃用不到的字段，缓存和后续副本都更小
+                            result = _slim_response(result)
+                        self._set_cached(cache_key, result)
+                        return result
+
+                    delay = self._retry_delay(attempt, headers.get('Retry-After'))
+                    # 不可重试、已无重试次数或等待后已超过截止时间时，直接报告本次的错误
+                    if (status not in RETRYABLE_STATUSES or attempt == self.max_retries - 1
+                            or loop.time() + delay >= deadline):
+                        # 错误信息按 UTF-8 解码响应字节，跳过字符集探测
+                        raise Exception(f"HTTP {status}: {body.decode('utf-8', errors='replace')}")
+
+                    logger.log(self._log_level, "[SearchService] HTTP %d，%.2f 秒后重试 (尝试 %d/%d): %s",
+                               status, delay, attempt + 1, self.max_retries, query)
+                    await asyncio.sleep(delay)
 
         except asyncio.TimeoutError:
             error_msg = f"搜索请求超时（超过 {timeout} 秒）"
-            if self.verbose:
-                print(f"[SearchService] {error_msg}")
+            logger.log(self._log_level, "[SearchService] %s", error_msg)
             raise Exception(error_msg)
-        except aiohttp.ClientError as e:
+        except _NETWORK_ERRORS as e:
             error_msg = f"网络请求失败: {str(e)}"
-            if self.verbose:
-                print(f"[SearchService] {error_msg}")
+            logger.log(self._log_level, "[SearchService] %s", error_msg)
             raise Exception(error_msg)
         except Exception as e:
-            if self.verbose:
-                print(f"[SearchService] 搜索失败: {e}")
+            logger.log(self._log_level, "[SearchService] 搜索失败: %s", e)
             raise
 
+    async def search_many(self,
+                          queries: List[str],
+                          concurrency: int = 8,
+                          **kwargs) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        并发执行多个搜索，同时进行的请求数不超过 concurrency
+
+        Args:
+            queries: 搜索查询字符串列表
+            concurrency: 最大并发请求数，默认8（与连接池的单主机连接数一致）
+            **kwargs: 传给 search() 的其他参数
+
+        Returns:
+            与 queries 顺序对应的结果列表，失败的查询对应位置为异常对象
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def _search_one(query: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.search(query, **kwargs)
+
+        return await asyncio.gather(*[_search_one(q) for q in queries], return_exceptions=True)
+
     def extract_context(self, search_response: Dict[str, Any], include_url: bool = False) -> str:
         """
         从搜索响应中提取有用的上下文信息
@@ -137,34 +474,31 @@ class SearchService:
         Returns:
             组合后的上下文文本，格式化为可读字符串
         """
-        results = search_response.get('results', [])
+        results = search_response.get('results')
 
         if not results:
-            return "未找到相关搜索结果"
-
-        context_parts = []
-
-        for i, result in enumerate(results, 1):
-            title = result.get('title', '无标题')
-            highlights = result.get('highlights', [])
-            url = result.get('url', '')
-
-            # 组合单个结果的上下文
-            result_context = f"【结果 {i}】\n标题: {title}\n"
+            return _EMPTY_RESULT_STRING
 
-            if include_url and url:
-                result_context += f"来源: {url}\n"
+        return "\n".join(_iter_context_lines(results, include_url))
 
-            if highlights:
-                result_context += "相关内容:\n"
-                for highlight in highlights:
-                    result_context += f"  - {highlight}\n"
-            else:
-                result_context += "相关内容: 无高亮内容\n"
+    async def extract_context_async(self, search_response: Dict[str, Any], include_url: bool = False) -> str:
+        """extract_context 的异步版本，在线程中执行，适合批量处理较大的搜索响应"""
+        return await asyncio.to_thread(self.extract_context, search_response, include_url)
 
-            context_parts.append(result_context)
+    @staticmethod
+    def _is_large_response(search_response: Dict[str, Any]) -> bool:
+        """判断搜索响应是否大到值得放到线程中提取上下文"""
+        results = search_response.get('results') or []
+        if len(results) > EXTRACT_OFFLOAD_MIN_RESULTS:
+            return True
 
-        return "\n".join(context_parts)
+        total_chars = 0
+        for result in results:
+            for highlight in result.get('highlights') or ():
+                total_chars += len(highlight)
+                if total_chars > EXTRACT_OFFLOAD_MIN_CHARS:
+                    return True
+        return False
 
     async def search_and_extract(self,
                                   query: str,
@@ -178,18 +512,19 @@ class SearchService:
             query: 搜索查询字符串
             num_results: 返回结果数量，默认3条
             include_url: 是否包含来源URL，默认False
-            timeout: 请求超时时间（秒），默认30秒
+            timeout: 整个搜索的超时时间（秒，包括重试），默认30秒
 
         Returns:
             格式化的上下文文本，失败时返回错误信息
         """
         try:
-            response = await self.search(query, num_results=num_results, timeout=timeout)
+            response = await self.search(query, num_results=num_results, timeout=timeout, extract_only=True)
+            if self._is_large_response(response):
+                return await self.extract_context_async(response, include_url=include_url)
             return self.extract_context(response, include_url=include_url)
         except Exception as e:
             error_msg = f"搜索失败: {str(e)}"
-            if self.verbose:
-                print(f"[SearchService] {error_msg}")
+            logger.log(self._log_level, "[SearchService] %s", error_msg)
             return error_msg
 
     async def __aenter__(self):
@@ -201,6 +536,51 @@ class SearchService:
         await self.close()
 
 
+# 进程级共享的连接池、session 和默认搜索服务，由 get_default_service() 惰性创建
+_shared_connector: Optional[aiohttp.TCPConnector] = None
+_shared_session: Optional[aiohttp.ClientSession] = None
+_default_service: Optional[SearchService] = None
+
+
+async def get_default_service() -> SearchService:
+    """
+    获取进程内共享的搜索服务（首次调用时创建），所有调用方复用同一个连接池
+
+    需在同一个事件循环内使用，退出前调用 close_default_service() 释放连接
+
+    Raises:
+        ValueError: 未配置 EXA_API_KEY 时抛出
+    """
+    global _shared_connector, _shared_session, _default_service
+
+    if _default_service is None or _shared_session is None or _shared_session.closed:
+        if _shared_connector is None or _shared_connector.closed:
+            _shared_connector = _create_connector()
+        # session 不持有连接池，关闭 session 时连接池保持可用，由 close_default_service() 统一关闭
+        session = aiohttp.ClientSession(connector=_shared_connector, connector_owner=False)
+        try:
+            _default_service = SearchService(session=session)
+        except ValueError:
+            await session.close()
+            raise
+        _shared_session = session
+
+    return _default_service
+
+
+async def close_default_service():
+    """关闭共享的搜索服务及其 session 和连接池"""
+    global _shared_connector, _shared_session, _default_service
+
+    _default_service = None
+    if _shared_session is not None:
+        await _shared_session.close()
+        _shared_session = None
+    if _shared_connector is not None:
+        await _shared_connector.close()
+        _shared_connector = None
+
+
 async def main():
     """测试函数 - 演示异步搜索服务用法"""
     print("=" * 80)
@@ -240,12 +620,12 @@ async def main():
 #        async with aiohttp.ClientSession() as session:
 #            service = SearchService(verbose=True, session=session)
 #
-#            # 可以并发执行多个搜索
+#            # 可以并发执行多个搜索（search_many 会限制同时进行的请求数）
 #            queries = ["量子计算", "人工智能", "区块链技术"]
-#            tasks = [service.search_and_extract(q, num_results=2) for q in queries]
-#            results = await asyncio.gather(*tasks)
+#            responses = await service.search_many(queries, concurrency=4, num_results=2)
 #
-#            for query, result in zip(queries, results):
+#            for query, response in zip(queries, responses):
+#                result = str(response) if isinstance(response, Exception) else service.extract_context(response)
 #                print(f"\n查询: {query}")
 #                print(result[:200] + "..." if len(result) > 200 else result)
 
@@ -259,4 +639,12 @@ async def main():
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    # 可选依赖：安装了 uvloop 时使用更快的事件循环（不支持 Windows）
+    try:
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())